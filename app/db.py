@@ -1,17 +1,108 @@
 import os
-from sqlalchemy import create_engine
+import sqlite3
+from pathlib import Path
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.pool import QueuePool
 
 # Файл SQLite в корне проекта (рядом с bot.py)
 _project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DB_PATH = os.path.join(_project_root, "app.db")
 DB_URL = f"sqlite:///{DB_PATH}"
 
+# Небольшой пул постоянных соединений: PRAGMA выполняются один раз на соединение,
+# WAL даёт параллельное чтение. StaticPool (одно общее соединение) не подходит —
+# хендлеры держат сессии через await, и транзакции разных сессий смешались бы.
 engine = create_engine(
     DB_URL,
     connect_args={"check_same_thread": False},
+    poolclass=QueuePool,
+    pool_size=4,
+    max_overflow=8,
+    insertmanyvalues_page_size=1000,
+)
+# expire_on_commit=False: после commit объекты не перечитываются из БД при следующем обращении.
+# scoped_session не используется — конкурентные хендлеры делили бы одну сессию.
+SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, expire_on_commit=False)
+
+# PRAGMA для каждого нового соединения: WAL (читатели не блокируют запись),
+# synchronous=NORMAL (fsync только на checkpoint), кэш и temp-таблицы в памяти.
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
 )
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in _SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def begin_immediate(db) -> None:
+    """Начать транзакцию сессии с BEGIN IMMEDIATE.
+
+    Блокировка на запись берётся сразу, без повышения shared → reserved
+    посреди транзакции. Вызывать до первого запроса в транзакции.
+    """
+    db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def backup_db(dest_path: str) -> None:
+    """Консистентная копия БД в dest_path через online backup API SQLite.
+
+    В отличие от копирования файла учитывает WAL и не захватывает
+    недописанную транзакцию. Блокирующая — из async-кода вызывать через to_thread.
+    """
+    src = sqlite3.connect(DB_PATH)
+    dst = sqlite3.connect(dest_path)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+def restore_db(src_path: str, dest_path: str = DB_PATH) -> None:
+    """Заменить содержимое живой БД файлом src_path через online backup API SQLite.
+
+    Файл поверх открытой WAL-базы не копируем: кадры из -wal пула соединений
+    потом дописались бы checkpoint'ом в новую базу. Backup пишет страницы через
+    обычную транзакцию, поэтому пул сразу видит новые данные. Блокирующая.
+    """
+    # mode=ro: отсутствующий файл — ошибка, а не пустая база поверх живой
+    src = sqlite3.connect(Path(src_path).resolve().as_uri() + "?mode=ro", uri=True)
+    dst = sqlite3.connect(dest_path)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+def snapshot_db() -> bytes:
+    """Консистентный снимок БД в виде байтов файла (backup в :memory: + serialize)."""
+    src = sqlite3.connect(DB_PATH)
+    mem = sqlite3.connect(":memory:")
+    try:
+        src.backup(mem)
+        return mem.serialize()
+    finally:
+        mem.close()
+        src.close()
+
+
+# PRAGMA user_version, с которой даты (EpochDateTime) уже хранятся в unix-секундах
+EPOCH_USER_VERSION = 1
 
 
 class Base(DeclarativeBase):
@@ -19,6 +110,55 @@ class Base(DeclarativeBase):
 
 
 def ensure_db_exists():
-    """Создаёт файл БД и таблицы, если их ещё нет."""
+    """Создаёт файл БД, таблицы и индексы, если их ещё нет.
+
+    Обычный старт — один запрос к sqlite_master; create_all только если чего-то не хватает.
+    Затем старые DATETIME-строки переводятся в unix-секунды (migrate_epoch_dates).
+    """
     from . import models  # noqa: F401 — регистрируем таблицы
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    tables = Base.metadata.tables.values()
+    expected = {t.name for t in tables} | {ix.name for t in tables for ix in t.indexes}
+    with engine.connect() as conn:
+        present = set(conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'index')"
+        ).scalars())
+    if not expected <= present:
+        Base.metadata.create_all(bind=engine)
+        # create_all не добавляет новые индексы к уже существующим таблицам
+        with engine.begin() as conn:
+            for table in tables:
+                for index in table.indexes:
+                    index.create(conn, checkfirst=True)
+
+    migrate_epoch_dates()
+
+
+def migrate_epoch_dates(bind=engine) -> bool:
+    """Перевести старые DATETIME-строки в unix-секунды (EpochDateTime). Блокирующая.
+
+    Один раз на файл БД: после перевода поднимается PRAGMA user_version, и дальше
+    таблицы не сканируются. Вызывается при старте и сразу после restore_db —
+    загруженная старая БД (user_version 0) переводится сразу, не дожидаясь перезапуска.
+    True, если перевод выполнялся.
+    """
+    from . import models
+    # Naive-строки хранились по Simferopol (UTC+3, без перехода на летнее время)
+    with bind.begin() as conn:
+        if conn.exec_driver_sql("PRAGMA user_version").scalar() >= EPOCH_USER_VERSION:
+            return False
+        # В загруженной старой БД части таблиц может не быть — их создаст ensure_db_exists
+        present = set(conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        ).scalars())
+        for table in Base.metadata.tables.values():
+            if table.name not in present:
+                continue
+            for col in table.columns:
+                if isinstance(col.type, models.EpochDateTime):
+                    conn.exec_driver_sql(
+                        f"UPDATE {table.name} "
+                        f"SET {col.name} = CAST(strftime('%s', {col.name}, '-3 hours') AS INTEGER) "
+                        f"WHERE typeof({col.name}) = 'text'"
+                    )
+        conn.exec_driver_sql(f"PRAGMA user_version = {EPOCH_USER_VERSION}")
+    return True
@@ -1,8 +1,37 @@
-from sqlalchemy import Integer, String, DateTime, Boolean
+from sqlalchemy import BigInteger, Integer, String, DateTime, Boolean, Index
 from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.types import TypeDecorator
 from datetime import datetime
 
 from .db import Base
+from .services import _moscow
+
+
+class EpochDateTime(TypeDecorator):
+    """datetime ⇄ INTEGER (unix-секунды UTC) — без разбора ISO-строк на каждой строке.
+
+    Naive datetime на записи — время Simferopol (как хранилось раньше).
+    На чтении — aware datetime в Simferopol. Старые DATETIME-строки тоже читаются,
+    их переводит в секунды ensure_db_exists.
+    """
+    impl = Integer
+    cache_ok = True
+    # Зона берётся через _moscow() при первой строке, а не при импорте модуля:
+    # к этому моменту bot.py уже загрузил .env (SERVICES_FAST_TZ)
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=_moscow())
+        return int(value.timestamp())
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return datetime.fromisoformat(value).replace(tzinfo=_moscow())
+        return datetime.fromtimestamp(value, _moscow())
 
 
 class Boss(Base):
@@ -14,29 +43,37 @@ class Boss(Base):
     first_spawn_minutes: Mapped[int | None] = mapped_column(Integer, nullable=True)  # первое появление после рестарта (мин)
     respawn_minutes: Mapped[int] = mapped_column(Integer)  # интервал респауна (мин)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
-    last_kill_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    last_kill_at: Mapped[datetime | None] = mapped_column(EpochDateTime, nullable=True)
 
 
 class KillLog(Base):
     __tablename__ = "kill_log"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    boss_id: Mapped[int] = mapped_column(Integer, index=True)
-    killed_at: Mapped[datetime] = mapped_column(DateTime)
+    boss_id: Mapped[int] = mapped_column(BigInteger, index=True)
+    killed_at: Mapped[datetime] = mapped_column(EpochDateTime)
     note: Mapped[str | None] = mapped_column(String, nullable=True)
 
 
+# Последнее убийство босса — поиск по индексу без сортировки
+Index("ix_kill_log_boss_killed", KillLog.boss_id, KillLog.killed_at.desc())
+# Частичный индекс только по активным боссам (список и тик уведомлений)
+Index("ix_bosses_active", Boss.id, sqlite_where=Boss.is_active == True)  # noqa: E712 — как в фильтрах: is_active = 1
+
+
 class ServerState(Base):
     __tablename__ = "server_state"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    server_restart_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    server_restart_at: Mapped[datetime | None] = mapped_column(EpochDateTime, nullable=True)
     notification_intervals: Mapped[str | None] = mapped_column(String, nullable=True, default="15,5,1")  # минуты через запятую
 
 
 class Subscriber(Base):
     """Подписчики на уведомления о боссах."""
     __tablename__ = "subscribers"
+    # Узкая таблица с естественным PK: строки лежат прямо в B-дереве ключа
+    __table_args__ = {"sqlite_with_rowid": False}
 
-    chat_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)  # Telegram chat_id — int64
     subscribed_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
\ No newline at end of file
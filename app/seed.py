@@ -1,14 +1,24 @@
 """Скрипт загрузки боссов в БД. Запуск: python -m app.seed"""
 import sys
 import os
+from collections import namedtuple
 
 # Запуск из корня проекта
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.db import engine, SessionLocal, Base
+from sqlalchemy import func, insert, select
+
+from app.db import engine, SessionLocal, Base, begin_immediate
 from app.models import Boss, ServerState
 from app.seed_data import BOSSES
 
+# Поля совпадают с колонками Boss — _asdict() сразу даёт параметры для insert(Boss)
+BossRow = namedtuple("BossRow", "name spawn_chance_percent first_spawn_minutes respawn_minutes")
+_BOSS_ROWS = tuple(
+    BossRow(r["name"], r["chance"], r["first_spawn_minutes"], r["respawn_minutes"])
+    for r in BOSSES
+)
+
 
 def run(reset: bool = False):
     if reset:
@@ -16,25 +26,24 @@ def run(reset: bool = False):
     Base.metadata.create_all(bind=engine)
     db = SessionLocal()
     try:
-        # Один ряд в server_state
-        if db.query(ServerState).first() is None:
-            db.add(ServerState(id=1, server_restart_at=None))
-            db.commit()
-
-        existing = {b.name for b in db.query(Boss).all()}
-        added = 0
-        for row in BOSSES:
-            if row["name"] in existing:
-                continue
-            db.add(Boss(
-                name=row["name"],
-                spawn_chance_percent=row["chance"],
-                first_spawn_minutes=row["first_spawn_minutes"],
-                respawn_minutes=row["respawn_minutes"],
-            ))
-            added += 1
-        db.commit()
-        print(f"Готово. Добавлено боссов: {added}, всего в БД: {db.query(Boss).count()}")
+        # server_state и боссы — в одной транзакции
+        with db.begin():
+            begin_immediate(db)
+            # Один ряд в server_state
+            if db.query(ServerState).first() is None:
+                db.add(ServerState(id=1, server_restart_at=None))
+
+            wanted = [row.name for row in _BOSS_ROWS]
+            existing = set(db.scalars(select(Boss.name).where(Boss.name.in_(wanted))).all())
+            # Один INSERT на всех боссов; render_nulls — чтобы None в first_spawn_minutes
+            # не разбивал пачку на группы с разным набором колонок
+            new_rows = [row._asdict() for row in _BOSS_ROWS if row.name not in existing]
+            if new_rows:
+                db.execute(insert(Boss).execution_options(render_nulls=True), new_rows)
+            added = len(new_rows)
+            # Точное число: в БД могут быть и боссы из /boss_add, не только из seed_data
+            total = db.scalar(select(func.count(Boss.id)))
+        print(f"Готово. Добавлено боссов: {added}, всего в БД: {total}")
     finally:
         db.close()
 
@@ -1,18 +1,38 @@
 """Логика расчёта следующего респауна. Время везде по Simferopol (UTC+3)."""
-from datetime import datetime, timedelta
-from zoneinfo import ZoneInfo
-import math
+from datetime import datetime, timedelta, timezone
+import functools
+import os
 
-MOSCOW = ZoneInfo("Europe/Simferopol")  # UTC+3
+_TRUE_VALUES = {"1", "true", "yes"}
+
+
+@functools.cache
+def _moscow():
+    """Зона Simferopol (UTC+3); zoneinfo импортируется и читает tzdata при первом вызове.
+
+    SERVICES_FAST_TZ=1 — фиксированный UTC+3 (как TZ в bot.py) без tzdata и
+    таблицы переходов: летнего времени там нет с 2014 года.
+    """
+    if os.environ.get("SERVICES_FAST_TZ", "").strip().lower() in _TRUE_VALUES:
+        return timezone(timedelta(hours=3), "MSK")
+    from zoneinfo import ZoneInfo
+    return ZoneInfo("Europe/Simferopol")
+
+
+def __getattr__(name: str):
+    # MOSCOW — ленивый атрибут модуля: `from app.services import MOSCOW` работает как раньше
+    if name == "MOSCOW":
+        return _moscow()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def now_moscow() -> datetime:
-    return datetime.now(MOSCOW)
+    return datetime.now(_moscow())
 
 
 def parse_moscow_naive(dt: datetime) -> datetime:
     """Интерпретировать naive datetime как Simferopol время."""
-    return dt.replace(tzinfo=MOSCOW)
+    return dt.replace(tzinfo=_moscow())
 
 
 def next_spawn_at(
@@ -42,44 +62,52 @@ def next_spawn_at(
     
     Параметр now нужен для "догонки" — если не передан, используется текущее время.
     """
+    if now is None:
+        now = now_moscow()
+    ts = next_spawn_ts(
+        int(last_kill_at.timestamp()) if last_kill_at is not None else None,
+        int(server_restart_at.timestamp()) if server_restart_at is not None else None,
+        first_spawn_minutes,
+        respawn_minutes,
+        int(now.timestamp()),
+    )
+    return datetime.fromtimestamp(ts, _moscow()) if ts is not None else None
+
+
+def next_spawn_ts(
+    last_kill_ts: int | None,
+    server_restart_ts: int | None,
+    first_spawn_minutes: int | None,
+    respawn_minutes: int,
+    now_ts: int,
+) -> int | None:
+    """
+    То же, что next_spawn_at, но на целых POSIX-секундах: только сложения и сравнения int.
+    Совпадает с SQL-выражением next_spawn_column в bot.py.
+    Вызывающий код переводит время в timestamp один раз и обратно — только для вывода.
+    """
     # Защита от бесконечного цикла при respawn_minutes <= 0
     if respawn_minutes <= 0:
         return None
+    period = respawn_minutes * 60
 
     # Если есть last_kill_at — считаем от него по resp (один цикл, без догонки)
-    if last_kill_at is not None:
-        return last_kill_at + timedelta(minutes=respawn_minutes)
+    if last_kill_ts is not None:
+        return last_kill_ts + period
 
     # Нет килла — считаем от рестарта с догонкой до текущего времени
-    if server_restart_at is None:
+    if server_restart_ts is None:
         return None
 
-    # Определяем время первого появления после рестарта
-    if first_spawn_minutes is not None:
-        first_spawn_at = server_restart_at + timedelta(minutes=first_spawn_minutes)
-    else:
-        # Нет first_spawn_minutes → босс появляется сразу при рестарте (first = 0)
-        first_spawn_at = server_restart_at
-
-    # Если now не передан, используем текущее время
-    if now is None:
-        now = now_moscow()
-
-    # Если первый респ ещё не наступил — возвращаем его
-    if now <= first_spawn_at:
-        return first_spawn_at
+    # Время первого появления; нет first_spawn_minutes → сразу при рестарте (first = 0)
+    first_spawn_ts = server_restart_ts + (first_spawn_minutes or 0) * 60
 
-    # Первый респ уже в прошлом
-    elapsed = (now - first_spawn_at).total_seconds() / 60  # в минутах
-    
-    # Если прошло меньше 2 минут — НЕ догоняем, возвращаем first_spawn_at как есть.
+    # Первый респ ещё не наступил или прошло не больше 2 минут — НЕ догоняем.
     # tick_notifications поймает его в окне [-1, +1] минута и отправит уведомление.
-    if elapsed <= 2:
-        return first_spawn_at
+    elapsed = now_ts - first_spawn_ts
+    if elapsed <= 120:
+        return first_spawn_ts
 
-    # Догоняем до ближайшего будущего респа
-    # Считаем, сколько полных циклов respawn_minutes прошло с first_spawn_at
-    k = math.ceil(elapsed / respawn_minutes)
-    next_spawn = first_spawn_at + timedelta(minutes=k * respawn_minutes)
-    
-    return next_spawn
+    # Догоняем до ближайшего будущего респа: k = ceil(elapsed / period) в целых
+    k = -(-elapsed // period)
+    return first_spawn_ts + k * period
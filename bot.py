@@ -3,30 +3,37 @@
 Telegram-бот для отслеживания респаунов рейд-боссов L2M.
 Время по Moscow (UTC+3). Токен из .env файла, админы из admins.txt.
 """
+import asyncio
 import os
+import random
 import re
 import logging
 import signal
+import struct
 import sys
+import tempfile
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
-from datetime import datetime, timedelta
-from zoneinfo import ZoneInfo
+from datetime import datetime, timedelta, timezone
 
 from dotenv import load_dotenv
+from sqlalchemy import Integer, case, delete, func, insert, null, select, type_coerce, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.error import Forbidden
 from telegram.ext import (
     Application,
     AIORateLimiter,
-    CommandHandler,
     CallbackQueryHandler,
     MessageHandler,
     ContextTypes,
     filters,
 )
 
-from app.db import SessionLocal
+from app.db import SessionLocal, backup_db, begin_immediate, migrate_epoch_dates, restore_db, snapshot_db
 from app.models import Boss, KillLog, ServerState, Subscriber
-from app.services import now_moscow, next_spawn_at, MOSCOW
+from app.services import next_spawn_ts
 
 load_dotenv()
 
@@ -38,7 +45,17 @@ logger = logging.getLogger(__name__)
 
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
 ADMINS_FILE = Path(__file__).parent / "admins.txt"
-TZ = ZoneInfo("Europe/Moscow")
+# Фиксированное смещение UTC+3 вместо IANA-зоны: в Simferopol/Moscow нет перехода
+# на летнее время (с 2014), а timezone() остаётся на быстром C-пути datetime.
+# Осознанный отход от IANA: если смещение когда-нибудь поменяется — править здесь.
+TZ = timezone(timedelta(hours=3), "MSK")
+
+# Шаблоны для parse_restart_arg / parse_kill_datetime / parse_duration
+_RE_DATETIME = re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{4})\s+(\d{1,2}):(\d{2})")
+_RE_HHMM = re.compile(r"(\d{1,2}):(\d{2})")
+_RE_DUR = re.compile(r"(\d+)([dhm])")
+_DUR_UNIT_MINUTES = {"d": 1440, "h": 60, "m": 1}
+_RE_DIGIT = re.compile(r"\d")
 
 # Кэш подписчиков (загружается из БД при старте)
 _subscribers: set[int] = set()
@@ -47,13 +64,9 @@ _subscribers: set[int] = set()
 def load_subscribers_from_db():
     """Загрузить подписчиков из БД в кэш."""
     global _subscribers
-    db = SessionLocal()
-    try:
-        subs = db.query(Subscriber).all()
-        _subscribers = {s.chat_id for s in subs}
+    with SessionLocal() as db:
+        _subscribers = set(db.scalars(select(Subscriber.chat_id)))
         logger.info(f"Загружено {len(_subscribers)} подписчиков из БД")
-    finally:
-        db.close()
 
 
 def add_subscriber(chat_id: int):
@@ -61,32 +74,76 @@ def add_subscriber(chat_id: int):
     if chat_id in _subscribers:
         return
     _subscribers.add(chat_id)
-    db = SessionLocal()
-    try:
-        exists = db.query(Subscriber).filter(Subscriber.chat_id == chat_id).first()
-        if not exists:
-            db.add(Subscriber(chat_id=chat_id))
-            db.commit()
+    with SessionLocal() as db:
+        # INSERT OR IGNORE — одна команда вместо SELECT + INSERT
+        result = db.execute(
+            sqlite_insert(Subscriber)
+            .values(chat_id=chat_id)
+            .on_conflict_do_nothing(index_elements=[Subscriber.chat_id])
+        )
+        db.commit()
+        if result.rowcount:
             logger.info(f"Новый подписчик: {chat_id}")
-    finally:
-        db.close()
 
 
 def remove_subscriber(chat_id: int):
     """Удалить подписчика из БД и кэша."""
     _subscribers.discard(chat_id)
-    db = SessionLocal()
-    try:
-        db.query(Subscriber).filter(Subscriber.chat_id == chat_id).delete()
+    with SessionLocal() as db:
+        db.execute(delete(Subscriber).where(Subscriber.chat_id == chat_id))
         db.commit()
-    finally:
-        db.close()
 
 
-def load_admins() -> set[str]:
-    if not ADMINS_FILE.exists():
+# Кэш admins.txt: (st_mtime_ns, админы). Файл перечитывается только при смене mtime.
+# Внешние правки подхватывает фоновая задача reload_admins_job.
+_admins_cache: tuple[int, set[str]] | None = None
+ADMINS_RELOAD_INTERVAL = 30  # секунды между проверками mtime admins.txt
+
+# Админы, разобранные один раз при загрузке admins.txt: числовые ID и @username
+# (без @, в нижнем регистре — username в Telegram регистронезависим).
+_admin_ids: frozenset[int] = frozenset()
+_admin_usernames: frozenset[str] = frozenset()
+
+
+def _admin_key(entry: str) -> str:
+    """Запись admins.txt в виде для сравнения: @username без учёта регистра, ID как есть."""
+    return entry.lower() if entry.startswith("@") else entry
+
+
+def _set_admins_cache(mtime: int, admins: set[str]) -> None:
+    global _admins_cache, _admin_ids, _admin_usernames
+    _admins_cache = (mtime, admins)
+    _admin_ids = frozenset(int(a) for a in admins if a.isdigit())
+    _admin_usernames = frozenset(_admin_key(a)[1:] for a in admins if a.startswith("@"))
+
+
+def is_admin(user) -> bool:
+    """Два поиска во frozenset, без обращения к диску и без аллокаций строк на ID."""
+    if user is None:
+        return False
+    return user.id in _admin_ids or (user.username is not None and user.username.lower() in _admin_usernames)
+
+
+class _AdminFilter(filters.MessageFilter):
+    """Фильтр PTB для админских апдейтов (загрузка файла БД)."""
+
+    def filter(self, message) -> bool:
+        return is_admin(message.from_user)
+
+
+ADMIN_FILTER = _AdminFilter(name="ADMIN_FILTER")
+
+
+def _cached_admins() -> set[str]:
+    # Один stat() вместо exists() + stat()
+    try:
+        mtime = ADMINS_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
         ADMINS_FILE.write_text("# Список админов\n", encoding="utf-8")
-        return set()
+        _set_admins_cache(ADMINS_FILE.stat().st_mtime_ns, set())
+        return _admins_cache[1]
+    if _admins_cache is not None and _admins_cache[0] == mtime:
+        return _admins_cache[1]
     admins = set()
     with open(ADMINS_FILE, "r", encoding="utf-8") as f:
         for line in f:
@@ -94,88 +151,207 @@ def load_admins() -> set[str]:
             if not line or line.startswith("#"):
                 continue
             admins.add(line)
+    _set_admins_cache(mtime, admins)
     return admins
 
 
+async def reload_admins_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Периодически перечитывает admins.txt, если его изменили вручную."""
+    _cached_admins()
+
+
+def load_admins() -> set[str]:
+    # Копия — вызывающий код может менять набор перед save_admins
+    return set(_cached_admins())
+
+
 def save_admins(admins: set[str]):
     with open(ADMINS_FILE, "w", encoding="utf-8") as f:
         f.write("# Список админов\n")
         for admin in sorted(admins):
             f.write(f"{admin}\n")
+    _set_admins_cache(ADMINS_FILE.stat().st_mtime_ns, set(admins))
 
 
-def is_admin(user) -> bool:
-    admins = load_admins()
-    if str(user.id) in admins:
-        return True
-    if user.username and f"@{user.username}" in admins:
-        return True
-    return False
+async def cmd_denied(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Админ-команда (или файл БД) от пользователя без прав."""
+    await update.message.reply_text("⛔ Недостаточно прав")
 
 
 def _naive_tz(dt: datetime) -> datetime:
     return dt.astimezone(TZ).replace(tzinfo=None)
 
 
+def _ts(dt: datetime | None) -> int | None:
+    """datetime → целые unix-секунды; naive считается временем TZ (как хранится в БД)."""
+    if dt is None:
+        return None
+    return int((dt.replace(tzinfo=TZ) if dt.tzinfo is None else dt).timestamp())
+
+
 def _aware_tz(dt: datetime | None) -> datetime | None:
     if dt is None:
         return None
     return dt.replace(tzinfo=TZ) if dt.tzinfo is None else dt.astimezone(TZ)
 
 
-def get_server_restart(db) -> datetime | None:
-    row = db.query(ServerState).filter(ServerState.id == 1).first()
-    return _aware_tz(row.server_restart_at) if row and row.server_restart_at else None
+def _get_state(db) -> ServerState | None:
+    """Единственная строка server_state — читаем один раз на хендлер/тик."""
+    return db.get(ServerState, 1)
+
+
+def get_boss(db, boss_id: int) -> Boss | None:
+    """Босс по ID: Session.get смотрит identity map сессии и только потом делает SELECT по PK."""
+    return db.get(Boss, boss_id)
+
 
+def get_server_restart(state: ServerState | None) -> datetime | None:
+    return _aware_tz(state.server_restart_at) if state and state.server_restart_at else None
 
-def set_server_restart(db, at: datetime | None):
+
+def set_server_restart(db, at: datetime | None, commit: bool = True):
+    """commit=False — вызывающий сам закоммитит вместе со своими изменениями."""
     val = _naive_tz(at) if at else None
-    row = db.query(ServerState).filter(ServerState.id == 1).first()
+    row = _get_state(db)
     if not row:
         db.add(ServerState(id=1, server_restart_at=val, notification_intervals="15,5,1"))
     else:
         row.server_restart_at = val
-    db.commit()
+    if commit:
+        db.commit()
+
 
+DEFAULT_INTERVALS = (15, 5, 1)
 
-def get_notification_intervals(db) -> list[int]:
+
+@lru_cache(maxsize=1)
+def parse_intervals(s: str) -> tuple[int, ...]:
+    """"15,5,1" → (15, 5, 1), по убыванию. Строка меняется редко — парсим один раз."""
+    return tuple(sorted((int(x) for x in s.split(",")), reverse=True))
+
+
+def get_notification_intervals(state: ServerState | None) -> tuple[int, ...]:
     """Получить интервалы уведомлений (в минутах)."""
-    row = db.query(ServerState).filter(ServerState.id == 1).first()
-    if not row or not row.notification_intervals:
-        return [15, 5, 1]
+    if not state or not state.notification_intervals:
+        return DEFAULT_INTERVALS
     try:
-        return sorted([int(x) for x in row.notification_intervals.split(",")], reverse=True)
-    except:
-        return [15, 5, 1]
+        return parse_intervals(state.notification_intervals)
+    except ValueError:
+        return DEFAULT_INTERVALS
 
 
 def set_notification_intervals(db, intervals: list[int]):
-    row = db.query(ServerState).filter(ServerState.id == 1).first()
+    value = ",".join(map(str, intervals))
+    row = _get_state(db)
     if not row:
-        db.add(ServerState(id=1, server_restart_at=None, notification_intervals=",".join(map(str, intervals))))
+        db.add(ServerState(id=1, server_restart_at=None, notification_intervals=value))
     else:
-        row.notification_intervals = ",".join(map(str, intervals))
+        row.notification_intervals = value
     db.commit()
+    # Новая строка вытесняет старую из кэша parse_intervals — тик сразу получит готовый кортеж
+    parse_intervals.cache_clear()
+    parse_intervals(value)
+
+
+def reset_kill_times(db) -> None:
+    """Сбросить last_kill_at всех боссов (при рестарте); commit — за вызывающим."""
+    # Отдельная функция: в хендлерах имя update занято параметром Update
+    db.execute(update(Boss).values(last_kill_at=None))
+
+
+def record_kill(db, boss: Boss, killed_at: datetime, note: str | None) -> None:
+    """Записать убийство: KillLog + Boss.last_kill_at в одной транзакции BEGIN IMMEDIATE."""
+    record_kills(db, [(boss.id, killed_at)], note)
+
+
+def record_kills(db, kills: list[tuple[int, datetime]], note: str | None) -> None:
+    """Записать убийства (boss_id, killed_at) — одна транзакция, один commit на все.
+
+    KillLog — один executemany INSERT, Boss.last_kill_at — один executemany UPDATE по PK.
+    """
+    rows = [(boss_id, _naive_tz(killed_at)) for boss_id, killed_at in kills]
+    begin_immediate(db)
+    db.execute(insert(KillLog), [{"boss_id": bid, "killed_at": val, "note": note} for bid, val in rows])
+    db.execute(update(Boss), [{"id": bid, "last_kill_at": val} for bid, val in rows])
+    db.commit()
+
+
+def next_spawn_column(restart_ts: int | None, now_ts: int):
+    """SQL-выражение следующего респа в unix-секундах — та же логика, что next_spawn_ts.
+
+    last_kill_at хранится целым числом (EpochDateTime), рестарт и now — параметры запроса.
+    """
+    period = Boss.respawn_minutes * 60
+    last_kill = type_coerce(Boss.last_kill_at, Integer)
+    if restart_ts is None:
+        from_restart = null()
+    else:
+        first = restart_ts + func.coalesce(Boss.first_spawn_minutes, 0) * 60
+        # В пределах 2 минут после first не догоняем; иначе first + ceil((now - first) / period) * period
+        from_restart = case(
+            (now_ts - first <= 120, first),
+            else_=first + ((now_ts - first + period - 1) // period) * period,
+        )
+    return case(
+        (Boss.respawn_minutes <= 0, null()),
+        (last_kill.is_not(None), last_kill + period),
+        else_=from_restart,
+    )
+
+
+def due_bosses(db, restart: datetime | None, now: datetime, horizon_min: int):
+    """Активные боссы, чей следующий респ в окне (now - 2 мин, now + horizon_min мин].
+
+    Окно фильтрует SQLite — в тик попадают только боссы, по которым может уйти уведомление.
+    Строки: (next_ts, id, name, spawn_chance_percent).
+    """
+    now_ts = _ts(now)
+    next_ts = next_spawn_column(_ts(restart), now_ts).label("next_ts")
+    return db.execute(
+        select(next_ts, Boss.id, Boss.name, Boss.spawn_chance_percent)
+        .where(Boss.is_active, next_ts > now_ts - 120, next_ts <= now_ts + horizon_min * 60)
+        .order_by(Boss.id)
+    ).all()
 
 
 def boss_next_spawn(boss: Boss, server_restart_at: datetime | None, now: datetime | None = None) -> datetime | None:
-    """Рассчитать следующий респ босса с учётом догонки до текущего времени."""
-    return next_spawn_at(
-        _aware_tz(boss.last_kill_at),
-        server_restart_at,
+    """Рассчитать следующий респ босса с учётом догонки до текущего времени.
+
+    Расчёт в unix-секундах (next_spawn_ts), в datetime переводится только результат.
+    """
+    ts = next_spawn_ts(
+        _ts(boss.last_kill_at),
+        _ts(server_restart_at),
         boss.first_spawn_minutes,
         boss.respawn_minutes,
-        now=now,
+        _ts(now or datetime.now(TZ)),
     )
+    return datetime.fromtimestamp(ts, TZ) if ts is not None else None
+
+
+@lru_cache(maxsize=1440)
+def _hhmm(hour: int, minute: int) -> str:
+    return f"{hour:02d}:{minute:02d}"
 
 
 def format_time_short(dt: datetime | None) -> str:
     """HH:MM или --:--"""
     if dt is None:
         return "--:--"
-    return dt.strftime("%H:%M")
+    return _hhmm(dt.hour, dt.minute)
+
+
+_TZ_OFFSET_S = int(TZ.utcoffset(None).total_seconds())
+
+
+def format_ts_short(ts: int | None) -> str:
+    """HH:MM по unix-секундам или --:-- — без datetime: TZ — фиксированное смещение."""
+    if ts is None:
+        return "--:--"
+    return _hhmm(*divmod((ts + _TZ_OFFSET_S) % 86400 // 60, 60))
 
 
+@lru_cache(maxsize=256)
 def format_respawn_interval(minutes: int) -> str:
     if minutes == 0:
         return "0h"
@@ -194,41 +370,62 @@ def format_respawn_interval(minutes: int) -> str:
 
 def format_list_text(db) -> str:
     """Список боссов: HH:MM | ID | имя | шанс% | resp 10h | first 5h"""
-    restart = get_server_restart(db)
-    bosses = db.query(Boss).filter(Boss.is_active).order_by(Boss.id).all()
+    restart = get_server_restart(_get_state(db))
     now = datetime.now(TZ)
-    rows = []
-    for b in bosses:
-        nxt = boss_next_spawn(b, restart, now=now)
-        time_str = format_time_short(nxt)
-        interval_str = format_respawn_interval(b.respawn_minutes)
-        first_str = format_respawn_interval(b.first_spawn_minutes) if b.first_spawn_minutes is not None else "—"
-        rows.append((nxt, b.id, b.name, b.spawn_chance_percent, time_str, interval_str, first_str))
-    rows.sort(key=lambda x: (x[0] is None, x[0] or datetime.max.replace(tzinfo=TZ)))
+    # Следующий респ считает и сортирует SQLite: один запрос, без расчёта по строкам в Python
+    next_ts = next_spawn_column(_ts(restart), _ts(now)).label("next_ts")
+    rows = db.execute(
+        select(
+            next_ts,
+            Boss.id,
+            Boss.name,
+            Boss.spawn_chance_percent,
+            Boss.respawn_minutes,
+            Boss.first_spawn_minutes,
+        )
+        .where(Boss.is_active)
+        .order_by(next_ts.nulls_last(), Boss.id)
+    )
     
-    lines = []
-    for _, bid, name, chance, time_str, interval_str, first_str in rows:
-        lines.append(f"{time_str} | {bid} | {name} | {chance}% | resp {interval_str} | first {first_str}")
-    return "\n".join(lines) if lines else "Нет активных боссов."
+    # Один проход по курсору сразу в итоговую строку, без промежуточных списков и datetime
+    text = "\n".join(
+        f"{format_ts_short(ts)} | {bid} | {name} | {chance}% | resp {format_respawn_interval(respawn_min)}"
+        f" | first {format_respawn_interval(first_min) if first_min is not None else '—'}"
+        for ts, bid, name, chance, respawn_min, first_min in rows
+    )
+    return text or "Нет активных боссов."
+
+
+# callback_data кнопок: hex от (код действия: uint8, boss_id: uint32) — разбор одним unpack
+_CB_STRUCT = struct.Struct("!BI")
+CB_KILL_CONFIRM = 1
+CB_KILL_DO = 2
+CB_KILL_CANCEL = 3
+
 
+def _callback_data(action: int, boss_id: int) -> str:
+    return _CB_STRUCT.pack(action, boss_id).hex()
 
-def make_kill_button(boss_id: int, boss_name: str) -> InlineKeyboardMarkup:
+
+# Разметка зависит только от boss_id, а объекты PTB неизменяемы — кэшируем
+@lru_cache(maxsize=512)
+def make_kill_button(boss_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
-        [InlineKeyboardButton("Босс убит", callback_data=f"kill_confirm_{boss_id}")]
+        [InlineKeyboardButton("Босс убит", callback_data=_callback_data(CB_KILL_CONFIRM, boss_id))]
     ])
 
 
+@lru_cache(maxsize=512)
 def make_confirm_buttons(boss_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
         [
-            InlineKeyboardButton("Босс убит", callback_data=f"kill_do_{boss_id}"),
-            InlineKeyboardButton("Отмена", callback_data=f"kill_cancel_{boss_id}"),
+            InlineKeyboardButton("Босс убит", callback_data=_callback_data(CB_KILL_DO, boss_id)),
+            InlineKeyboardButton("Отмена", callback_data=_callback_data(CB_KILL_CANCEL, boss_id)),
         ]
     ])
 
 
-async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    help_text = """
+HELP_TEXT = """
 🤖 **Команды бота**
 
 📋 **/list**
@@ -266,10 +463,13 @@ async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 ✅ Вы автоматически подписаны на уведомления о респах!
 """
+
+
+async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     # Автоматическая подписка при /help
     add_subscriber(update.effective_chat.id)
     try:
-        await update.message.reply_text(help_text, parse_mode="Markdown")
+        await update.message.reply_text(HELP_TEXT, parse_mode="Markdown")
     except Exception as e:
         logger.error(f"Ошибка в cmd_help: {e}", exc_info=True)
 
@@ -284,68 +484,95 @@ async def cmd_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = update.effective_chat.id
     add_subscriber(chat_id)
     
-    db = SessionLocal()
+    with SessionLocal() as db:
+        try:
+            text = format_list_text(db)
+            await update.message.reply_text(text)
+        except Exception as e:
+            logger.error(f"Ошибка в cmd_list: {e}", exc_info=True)
+            await update.message.reply_text(f"❌ Ошибка при получении списка: {str(e)}")
+
+
+async def _cb_kill_confirm(query, boss_id: int, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await query.edit_message_reply_markup(reply_markup=make_confirm_buttons(boss_id))
+
+
+async def _cb_kill_do(query, boss_id: int, context: ContextTypes.DEFAULT_TYPE) -> None:
+    with SessionLocal() as db:
+        boss = get_boss(db, boss_id)
+        if not boss:
+            await query.edit_message_text("Босс не найден.")
+            return
+        
+        now = datetime.now(TZ)
+        record_kill(db, boss, now, "button kill")
+        wake_tick(context)
+        
+        restart = get_server_restart(_get_state(db))
+        nxt = boss_next_spawn(boss, restart, now=now)
+        next_time = format_time_short(nxt)
+        
+        await query.edit_message_text(
+            f"✅ Убийство [{boss.id}] {boss.name} зафиксировано.\n"
+            f"Следующий респ: {next_time}"
+        )
+
+
+async def _cb_kill_cancel(query, boss_id: int, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await query.edit_message_text("Отменено.")
+
+
+# Код действия из callback_data → обработчик
+CALLBACK_ACTIONS = {
+    CB_KILL_CONFIRM: _cb_kill_confirm,
+    CB_KILL_DO: _cb_kill_do,
+    CB_KILL_CANCEL: _cb_kill_cancel,
+}
+# Кнопки в сообщениях, отправленных до перехода на упакованный формат: "<действие>_<boss_id>"
+_LEGACY_CB_ACTIONS = {
+    "kill_confirm": CB_KILL_CONFIRM,
+    "kill_do": CB_KILL_DO,
+    "kill_cancel": CB_KILL_CANCEL,
+}
+
+
+def parse_callback_data(data: str) -> tuple[int, int] | None:
+    """callback_data → (код действия, boss_id) или None."""
     try:
-        text = format_list_text(db)
-        await update.message.reply_text(text)
-    except Exception as e:
-        logger.error(f"Ошибка в cmd_list: {e}", exc_info=True)
-        await update.message.reply_text(f"❌ Ошибка при получении списка: {str(e)}")
-    finally:
-        db.close()
+        return _CB_STRUCT.unpack(bytes.fromhex(data))
+    except (ValueError, struct.error):
+        action, _, boss_id = data.rpartition("_")
+        if action in _LEGACY_CB_ACTIONS and boss_id.isdigit():
+            return _LEGACY_CB_ACTIONS[action], int(boss_id)
+        return None
 
 
 async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     await query.answer()
     
-    data = query.data
-    
-    if data.startswith("kill_confirm_"):
-        boss_id = int(data.split("_")[2])
-        await query.edit_message_reply_markup(reply_markup=make_confirm_buttons(boss_id))
-    
-    elif data.startswith("kill_do_"):
-        boss_id = int(data.split("_")[2])
-        db = SessionLocal()
-        try:
-            boss = db.query(Boss).filter(Boss.id == boss_id).first()
-            if not boss:
-                await query.edit_message_text("Босс не найден.")
-                return
-            
-            now = datetime.now(TZ)
-            boss.last_kill_at = _naive_tz(now)
-            db.add(KillLog(boss_id=boss.id, killed_at=boss.last_kill_at, note="button kill"))
-            db.commit()
-            
-            restart = get_server_restart(db)
-            nxt = boss_next_spawn(boss, restart)
-            next_time = format_time_short(nxt)
-            
-            await query.edit_message_text(
-                f"✅ Убийство [{boss.id}] {boss.name} зафиксировано.\n"
-                f"Следующий респ: {next_time}"
-            )
-        finally:
-            db.close()
-    
-    elif data.startswith("kill_cancel_"):
-        await query.edit_message_text("Отменено.")
+    parsed = parse_callback_data(query.data or "")
+    if parsed is None:
+        return
+    action, boss_id = parsed
+    handler = CALLBACK_ACTIONS.get(action)
+    if handler:
+        await handler(query, boss_id, context)
 
 
-def parse_restart_arg(s: str) -> datetime | None:
+def parse_restart_arg(s: str, now: datetime | None = None) -> datetime | None:
+    if now is None:
+        now = datetime.now(TZ)
     s = (s or "").strip()
     if s.lower() == "now" or not s:
-        return datetime.now(TZ)
-    m = re.match(r"(\d{1,2})\.(\d{1,2})\.(\d{4})\s+(\d{1,2}):(\d{2})", s)
+        return now
+    m = _RE_DATETIME.match(s)
     if m:
         d, mo, y, h, mi = int(m.group(1)), int(m.group(2)), int(m.group(3)), int(m.group(4)), int(m.group(5))
         return datetime(y, mo, d, h, mi, tzinfo=TZ)
-    m = re.match(r"(\d{1,2}):(\d{2})", s)
+    m = _RE_HHMM.match(s)
     if m:
         h, mi = int(m.group(1)), int(m.group(2))
-        now = datetime.now(TZ)
         today = now.replace(hour=h, minute=mi, second=0, microsecond=0)
         if today <= now:
             today += timedelta(days=1)
@@ -354,68 +581,56 @@ def parse_restart_arg(s: str) -> datetime | None:
 
 
 async def cmd_restart(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not is_admin(update.effective_user):
-        await update.message.reply_text("⛔ Недостаточно прав")
-        return
-    
     args = (update.message.text or "").split(maxsplit=1)
     arg = args[1].strip() if len(args) > 1 else "now"
-    dt = parse_restart_arg(arg)
+    now = datetime.now(TZ)
+    dt = parse_restart_arg(arg, now)
     if dt is None:
         await update.message.reply_text("Формат: /restart [DD.MM.YYYY HH:MM] или /restart HH:MM или /restart now")
         return
-    db = SessionLocal()
-    try:
-        set_server_restart(db, dt)
-        # Сбрасываем last_kill_at для всех боссов при рестарте
-        db.query(Boss).update({Boss.last_kill_at: None})
+    with SessionLocal() as db:
+        # Рестарт и сброс таймеров — одна транзакция, один fsync
+        set_server_restart(db, dt, commit=False)
+        reset_kill_times(db)
         db.commit()
+        wake_tick(context)
         
         text = f"✅ Время рестарта установлено: {dt.strftime('%d.%m.%Y %H:%M')}\n🔄 Все таймеры боссов сброшены\n\n{format_list_text(db)}"
         await update.message.reply_text(text)
         
         # Уведомления о быстрых боссах (first <= 5 минут) — только если их первое появление ещё в будущем
-        now = datetime.now(TZ)
-        fast_bosses = db.query(Boss).filter(
-            Boss.is_active,
-            Boss.first_spawn_minutes != None,
-            Boss.first_spawn_minutes <= 5
+        # Только нужные колонки — строки-кортежи без ORM-объектов и identity map
+        fast_bosses = db.execute(
+            select(Boss.id, Boss.name, Boss.spawn_chance_percent, Boss.first_spawn_minutes).where(
+                Boss.is_active,
+                Boss.first_spawn_minutes != None,
+                Boss.first_spawn_minutes <= 5
+            )
         ).all()
         
-        if fast_bosses and _subscribers:
+        subs = tuple(_subscribers)
+        if fast_bosses and subs:
             for boss in fast_bosses:
                 spawn_time = dt + timedelta(minutes=boss.first_spawn_minutes or 0)
                 # Отправляем уведомление только если spawn_time в будущем (или очень близко)
                 if spawn_time >= now - timedelta(minutes=1):
                     time_str = format_time_short(spawn_time)
                     message = f"🔴 После рестарта через {boss.first_spawn_minutes}м:\n{time_str} | {boss.id} | {boss.name} | {boss.spawn_chance_percent}%"
-                    
-                    for chat_id in list(_subscribers):
-                        try:
-                            sent_msg = await context.bot.send_message(chat_id=chat_id, text=message)
-                            # Удалить сообщение через 4 минут
-                            context.job_queue.run_once(
-                                delete_message_job,
-                                when=240,
-                                data={"chat_id": chat_id, "message_id": sent_msg.message_id}
-                            )
-                        except Exception as e:
-                            logger.error(f"Не удалось отправить в {chat_id}: {e}")
-                            # _subscribers.discard(chat_id)
-    finally:
-        db.close()
+                    # Удалить сообщение через 4 минуты
+                    await broadcast(context, message, delete_after=240, subs=subs)
 
 
-def parse_kill_datetime(s: str) -> datetime | None:
+def parse_kill_datetime(s: str, now: datetime | None = None) -> datetime | None:
     s = (s or "").strip()
-    m = re.match(r"(\d{1,2})\.(\d{1,2})\.(\d{4})\s+(\d{1,2}):(\d{2})", s)
+    m = _RE_DATETIME.match(s)
     if m:
         d, mo, y, h, mi = int(m.group(1)), int(m.group(2)), int(m.group(3)), int(m.group(4)), int(m.group(5))
         return datetime(y, mo, d, h, mi, tzinfo=TZ)
-    m = re.match(r"(\d{1,2}):(\d{2})", s)
+    m = _RE_HHMM.match(s)
     if m:
         h, mi = int(m.group(1)), int(m.group(2))
-        now = datetime.now(TZ)
+        if now is None:
+            now = datetime.now(TZ)
         today = now.replace(hour=h, minute=mi, second=0, microsecond=0)
         if today > now:
             return today - timedelta(days=1)
@@ -424,11 +639,7 @@ def parse_kill_datetime(s: str) -> datetime | None:
 
 
 async def cmd_kill(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not is_admin(update.effective_user):
-        await update.message.reply_text("⛔ Недостаточно прав")
-        return
-    
-    parts = (update.message.text or "").strip().split()
+    parts = (update.message.text or "").strip().split(maxsplit=2)
     if len(parts) < 2:
         await update.message.reply_text(
             "Использование:\n"
@@ -443,37 +654,35 @@ async def cmd_kill(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await update.message.reply_text("ID босса должен быть числом.")
         return
 
-    db = SessionLocal()
-    try:
-        boss = db.query(Boss).filter(Boss.id == boss_id).first()
+    with SessionLocal() as db:
+        boss = get_boss(db, boss_id)
         if not boss:
             await update.message.reply_text("Босс с таким ID не найден.")
             return
 
+        now = datetime.now(TZ)
         if len(parts) == 2:
-            killed_at = datetime.now(TZ)
+            killed_at = now
         else:
-            killed_at = parse_kill_datetime(" ".join(parts[2:]))
+            # maxsplit=2: parts[2] — весь хвост со временем, без повторной склейки
+            killed_at = parse_kill_datetime(parts[2], now)
             if killed_at is None:
                 await update.message.reply_text("Неверный формат времени. Примеры: 14:30 или 01.02.2026 14:30")
                 return
 
-        boss.last_kill_at = _naive_tz(killed_at)
-        db.add(KillLog(boss_id=boss.id, killed_at=boss.last_kill_at, note=None))
-        db.commit()
+        record_kill(db, boss, killed_at, None)
+        wake_tick(context)
         
-        restart = get_server_restart(db)
-        nxt = boss_next_spawn(boss, restart)
+        restart = get_server_restart(_get_state(db))
+        nxt = boss_next_spawn(boss, restart, now=now)
         next_time = format_time_short(nxt)
         
         text = f"✅ Убийство [{boss.id}] {boss.name} зафиксировано: {killed_at.strftime('%d.%m.%Y %H:%M')}\nСледующий респ: {next_time}"
         await update.message.reply_text(text)
-    finally:
-        db.close()
 
 
 async def cmd_test(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    parts = (update.message.text or "").strip().split()
+    parts = (update.message.text or "").strip().split(maxsplit=2)
     if len(parts) < 2:
         await update.message.reply_text("Использование: /test <bossId>")
         return
@@ -484,9 +693,8 @@ async def cmd_test(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await update.message.reply_text("ID босса должен быть числом.")
         return
     
-    db = SessionLocal()
-    try:
-        boss = db.query(Boss).filter(Boss.id == boss_id).first()
+    with SessionLocal() as db:
+        boss = get_boss(db, boss_id)
         if not boss:
             await update.message.reply_text("Босс не найден.")
             return
@@ -496,17 +704,10 @@ async def cmd_test(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             test_time = now + timedelta(minutes=i)
             time_str = test_time.strftime("%H:%M")
             text = f"{time_str} | {boss.id} | {boss.name} | {boss.spawn_chance_percent}%"
-            await update.message.reply_text(text, reply_markup=make_kill_button(boss.id, boss.name))
-    finally:
-        db.close()
+            await update.message.reply_text(text, reply_markup=make_kill_button(boss.id))
 
 
-async def cmd_settings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not is_admin(update.effective_user):
-        await update.message.reply_text("⛔ Недостаточно прав")
-        return
-    
-    text = """
+SETTINGS_TEXT = """
 ⚙️ **Settings (Admin only)**
 
 **1) Добавить босса**
@@ -539,14 +740,17 @@ async def cmd_settings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 • `/kill` — записывает время, счёт по resp
 • Форматы: `10h`, `30m`, `1d`, `2h30m`
 """
-    await update.message.reply_text(text, parse_mode="Markdown")
+
+
+async def cmd_settings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.message.reply_text(SETTINGS_TEXT, parse_mode="Markdown")
+
+
+# Экранирование спецсимволов Markdown за один проход
+_MD_ESCAPE = str.maketrans({"_": "\\_", "*": "\\*", "[": "\\[", "`": "\\`"})
 
 
 async def cmd_admin_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not is_admin(update.effective_user):
-        await update.message.reply_text("⛔ Недостаточно прав")
-        return
-    
     admins = load_admins()
     if not admins:
         await update.message.reply_text("Список админов пуст.")
@@ -554,7 +758,7 @@ async def cmd_admin_list(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     admin_lines = []
     for admin in sorted(admins):
-        escaped = admin.replace("_", "\\_").replace("*", "\\*").replace("[", "\\[").replace("`", "\\`")
+        escaped = admin.translate(_MD_ESCAPE)
         admin_lines.append(f"• {escaped}")
     
     text = "👮 **Список админов:**\n\n" + "\n".join(admin_lines)
@@ -563,10 +767,6 @@ async def cmd_admin_list(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
 async def cmd_backup(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Отправляет файл базы данных в чат."""
-    if not is_admin(update.effective_user):
-        await update.message.reply_text("⛔ Недостаточно прав")
-        return
-    
     from app.db import DB_PATH
     
     if not os.path.exists(DB_PATH):
@@ -574,12 +774,13 @@ async def cmd_backup(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         return
     
     try:
-        with open(DB_PATH, "rb") as f:
-            await update.message.reply_document(
-                document=f,
-                filename=f"app_backup_{datetime.now(TZ).strftime('%Y%m%d_%H%M%S')}.db",
-                caption="📦 Резервная копия базы данных"
-            )
+        # Снимок через backup API — в отдельном потоке, чтобы не блокировать event loop
+        data = await asyncio.to_thread(snapshot_db)
+        await update.message.reply_document(
+            document=data,
+            filename=f"app_backup_{datetime.now(TZ).strftime('%Y%m%d_%H%M%S')}.db",
+            caption="📦 Резервная копия базы данных"
+        )
     except Exception as e:
         logger.error(f"Ошибка при отправке backup: {e}", exc_info=True)
         await update.message.reply_text(f"❌ Ошибка: {str(e)}")
@@ -587,10 +788,6 @@ async def cmd_backup(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
 
 async def handle_db_restore(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обрабатывает загруженный файл БД для восстановления."""
-    if not is_admin(update.effective_user):
-        await update.message.reply_text("⛔ Недостаточно прав")
-        return
-    
     document = update.message.document
     if not document:
         return
@@ -607,12 +804,21 @@ async def handle_db_restore(update: Update, context: ContextTypes.DEFAULT_TYPE)
         # Создаём резервную копию текущей БД
         backup_path = DB_PATH + f".backup_{datetime.now(TZ).strftime('%Y%m%d_%H%M%S')}"
         if os.path.exists(DB_PATH):
-            import shutil
-            shutil.copy2(DB_PATH, backup_path)
+            await asyncio.to_thread(backup_db, backup_path)
         
-        # Скачиваем файл
-        file = await document.get_file()
-        await file.download_to_drive(DB_PATH)
+        # Скачиваем во временный файл и переносим в живую БД через backup API:
+        # запись поверх открытого WAL-файла смешала бы старые и новые данные
+        fd, upload_path = tempfile.mkstemp(suffix=".db", dir=os.path.dirname(DB_PATH))
+        os.close(fd)
+        try:
+            file = await document.get_file()
+            await file.download_to_drive(upload_path)
+            await asyncio.to_thread(restore_db, upload_path)
+            # Старая загрузка с датами-строками: перевести сразу, а не при перезапуске —
+            # иначе next_spawn_column считал бы по тексту
+            await asyncio.to_thread(migrate_epoch_dates)
+        finally:
+            os.remove(upload_path)
         
         await update.message.reply_text(
             f"✅ База данных восстановлена из файла: {filename}\n"
@@ -638,29 +844,27 @@ def parse_duration(s: str) -> int | None:
     if s in ("0", "0h", "0m"):
         return 0
     
-    total = 0
-    m = re.search(r"(\d+)d", s)
-    if m:
-        total += int(m.group(1)) * 1440
-    m = re.search(r"(\d+)h", s)
-    if m:
-        total += int(m.group(1)) * 60
-    m = re.search(r"(\d+)m", s)
-    if m:
-        total += int(m.group(1))
+    # Без цифр — значение не указано
+    if not _RE_DIGIT.search(s):
+        return None
     
-    # Если нашли хоть что-то, возвращаем (может быть 0)
-    if re.search(r"\d", s):
-        return total
-    return None
+    # Нашли хоть что-то — возвращаем (может быть 0)
+    # Один проход по строке: "1d2h30m" → [("1", "d"), ("2", "h"), ("30", "m")]
+    return sum(int(n) * _DUR_UNIT_MINUTES[u] for n, u in _RE_DUR.findall(s))
+
+
+@lru_cache(maxsize=128)
+def _respawn_reply_lines(respawn_min: int, first_min: int | None) -> str:
+    """Строки «Респ после убийства/рестарта» для ответов /boss_add и /boss_edit."""
+    first_display = format_respawn_interval(first_min) if first_min is not None else "—"
+    return (
+        f"Респ после убийства: {format_respawn_interval(respawn_min)}\n"
+        f"Респ после рестарта: {first_display}"
+    )
 
 
 async def cmd_boss_add(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not is_admin(update.effective_user):
-        await update.message.reply_text("⛔ Недостаточно прав")
-        return
-    
-    parts = (update.message.text or "").strip().split()
+    parts = (update.message.text or "").strip().split(maxsplit=5)
     if len(parts) < 4:
         await update.message.reply_text(
             "Использование:\n"
@@ -698,9 +902,8 @@ async def cmd_boss_add(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         )
         return
     
-    db = SessionLocal()
-    try:
-        exists = db.query(Boss).filter(Boss.name == name).first()
+    with SessionLocal() as db:
+        exists = db.scalar(select(Boss).where(Boss.name == name))
         if exists:
             await update.message.reply_text(f"Босс '{name}' уже существует (ID {exists.id}).")
             return
@@ -715,27 +918,18 @@ async def cmd_boss_add(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         )
         db.add(boss)
         db.commit()
+        wake_tick(context)
         db.refresh(boss)
         
-        interval_str = format_respawn_interval(respawn_min)
-        first_display = format_respawn_interval(first_min) if first_min is not None else "—"
-        
         await update.message.reply_text(
             f"✅ Босс добавлен:\n"
             f"ID {boss.id} | {boss.name} | {chance}%\n"
-            f"Респ после убийства: {interval_str}\n"
-            f"Респ после рестарта: {first_display}"
+            f"{_respawn_reply_lines(respawn_min, first_min)}"
         )
-    finally:
-        db.close()
 
 
 async def cmd_boss_del(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not is_admin(update.effective_user):
-        await update.message.reply_text("⛔ Недостаточно прав")
-        return
-    
-    parts = (update.message.text or "").strip().split()
+    parts = (update.message.text or "").strip().split(maxsplit=2)
     if len(parts) < 2:
         await update.message.reply_text("Использование: /boss_del <id>")
         return
@@ -746,9 +940,8 @@ async def cmd_boss_del(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         await update.message.reply_text("ID должен быть числом.")
         return
     
-    db = SessionLocal()
-    try:
-        boss = db.query(Boss).filter(Boss.id == boss_id).first()
+    with SessionLocal() as db:
+        boss = get_boss(db, boss_id)
         if not boss:
             await update.message.reply_text("Босс не найден.")
             return
@@ -756,16 +949,10 @@ async def cmd_boss_del(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         db.delete(boss)
         db.commit()
         await update.message.reply_text(f"✅ Босс [{boss_id}] {boss.name} удалён.")
-    finally:
-        db.close()
 
 
 async def cmd_boss_edit(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not is_admin(update.effective_user):
-        await update.message.reply_text("⛔ Недостаточно прав")
-        return
-    
-    parts = (update.message.text or "").strip().split()
+    parts = (update.message.text or "").strip().split(maxsplit=6)
     if len(parts) < 5:
         await update.message.reply_text("Использование: /boss_edit <id> <Имя> <Шанс%> <респ> [первое]\nПример: /boss_edit 48 Чертуба 50% 12h 5h")
         return
@@ -785,9 +972,8 @@ async def cmd_boss_edit(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         await update.message.reply_text("Неверный формат. Респ после убийства должен быть > 0.")
         return
     
-    db = SessionLocal()
-    try:
-        boss = db.query(Boss).filter(Boss.id == boss_id).first()
+    with SessionLocal() as db:
+        boss = get_boss(db, boss_id)
         if not boss:
             await update.message.reply_text("Босс не найден.")
             return
@@ -797,25 +983,16 @@ async def cmd_boss_edit(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         boss.respawn_minutes = respawn_min
         boss.first_spawn_minutes = first_min
         db.commit()
-        
-        interval_str = format_respawn_interval(respawn_min)
-        first_display = format_respawn_interval(first_min) if first_min is not None else "—"
+        wake_tick(context)
         
         await update.message.reply_text(
             f"✅ Босс [{boss_id}] обновлён:\n"
             f"{name} | {chance}%\n"
-            f"Респ после убийства: {interval_str}\n"
-            f"Респ после рестарта: {first_display}"
+            f"{_respawn_reply_lines(respawn_min, first_min)}"
         )
-    finally:
-        db.close()
 
 
 async def cmd_notifications(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not is_admin(update.effective_user):
-        await update.message.reply_text("⛔ Недостаточно прав")
-        return
-    
     parts = (update.message.text or "").strip().split()
     if len(parts) < 2:
         await update.message.reply_text("Использование: /notifications <минуты>\nПример: /notifications 20 15 5 1")
@@ -829,20 +1006,14 @@ async def cmd_notifications(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_text("Все значения должны быть числами.")
         return
     
-    db = SessionLocal()
-    try:
+    with SessionLocal() as db:
         set_notification_intervals(db, intervals)
+        wake_tick(context)
         await update.message.reply_text(f"✅ Уведомления настроены: за {', '.join(map(str, sorted(intervals, reverse=True)))} минут до респа.")
-    finally:
-        db.close()
 
 
 async def cmd_admin_add(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not is_admin(update.effective_user):
-        await update.message.reply_text("⛔ Недостаточно прав")
-        return
-    
-    parts = (update.message.text or "").strip().split()
+    parts = (update.message.text or "").strip().split(maxsplit=2)
     if len(parts) < 2:
         await update.message.reply_text("Использование: /admin_add @username")
         return
@@ -850,7 +1021,8 @@ async def cmd_admin_add(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     new_admin = parts[1]
     admins = load_admins()
     
-    if new_admin in admins:
+    # Сравнение как в is_admin: @Name и @name — один админ
+    if _admin_key(new_admin) in {_admin_key(a) for a in admins}:
         await update.message.reply_text(f"{new_admin} уже является админом.")
         return
     
@@ -860,11 +1032,7 @@ async def cmd_admin_add(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 
 
 async def cmd_admin_del(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not is_admin(update.effective_user):
-        await update.message.reply_text("⛔ Недостаточно прав")
-        return
-    
-    parts = (update.message.text or "").strip().split()
+    parts = (update.message.text or "").strip().split(maxsplit=2)
     if len(parts) < 2:
         await update.message.reply_text("Использование: /admin_del @username")
         return
@@ -872,20 +1040,72 @@ async def cmd_admin_del(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     del_admin = parts[1]
     admins = load_admins()
     
-    if del_admin not in admins:
+    key = _admin_key(del_admin)
+    matches = {a for a in admins if _admin_key(a) == key}
+    if not matches:
         await update.message.reply_text(f"{del_admin} не найден в админах.")
         return
     
-    admins.remove(del_admin)
+    admins -= matches
     save_admins(admins)
     await update.message.reply_text(f"✅ {del_admin} удалён из админов.")
 
 
-_sent_notifications: set[tuple[int, str, int]] = set()  # (boss_id, spawn_key, minutes_before)
+# (boss_id, spawn_epoch, minutes_before) → время отправки; порядок вставки = порядок отправки.
+# Ограничен по размеру (FIFO) и по возрасту записей, чтобы не рос бесконечно.
+_sent_notifications: OrderedDict[tuple[int, int, int], float] = OrderedDict()
+SENT_NOTIFICATIONS_MAX = 10000
+SENT_NOTIFICATIONS_TTL = 86400  # секунды: через сутки ключ точно не понадобится
+
+
+def _mark_sent(key: tuple[int, int, int], now_ts: float) -> bool:
+    """True, если уведомление с таким ключом ещё не отправлялось (и помечает его отправленным)."""
+    if key in _sent_notifications:
+        return False
+    _sent_notifications[key] = now_ts
+    if len(_sent_notifications) > SENT_NOTIFICATIONS_MAX:
+        _sent_notifications.popitem(last=False)
+    return True
 
 
-def _spawn_key(nt: datetime) -> str:
-    return nt.strftime("%Y-%m-%d %H:%M") if nt else ""
+def _prune_sent(now_ts: float) -> None:
+    """Удалить ключи старше SENT_NOTIFICATIONS_TTL — они в начале словаря."""
+    expire_before = now_ts - SENT_NOTIFICATIONS_TTL
+    while _sent_notifications:
+        key, sent_at = next(iter(_sent_notifications.items()))
+        if sent_at > expire_before:
+            break
+        del _sent_notifications[key]
+
+
+async def broadcast(
+    context: ContextTypes.DEFAULT_TYPE,
+    text: str,
+    delete_after: int,
+    subs: tuple[int, ...] | None = None,
+) -> None:
+    """Разослать сообщение подписчикам параллельно и удалить его через delete_after секунд.
+
+    subs — снимок подписчиков, снятый один раз на тик/команду; по умолчанию текущий набор.
+    """
+    if subs is None:
+        subs = tuple(_subscribers)
+    results = await asyncio.gather(
+        *(context.bot.send_message(chat_id=chat_id, text=text) for chat_id in subs),
+        return_exceptions=True,
+    )
+    for chat_id, result in zip(subs, results):
+        if isinstance(result, Exception):
+            logger.error(f"Не удалось отправить в {chat_id}: {result}")
+            # Отписываем только если бот заблокирован / удалён из чата, а не при сетевых сбоях
+            if isinstance(result, Forbidden):
+                remove_subscriber(chat_id)
+            continue
+        context.job_queue.run_once(
+            delete_message_job,
+            when=delete_after,
+            data={"chat_id": chat_id, "message_id": result.message_id}
+        )
 
 
 async def delete_message_job(context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -900,100 +1120,195 @@ async def delete_message_job(context: ContextTypes.DEFAULT_TYPE) -> None:
 
 
 async def auto_kill_job(context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Авто-kill босса через 20 секунд после появления."""
-    job_data = context.job.data
-    boss_id = job_data["boss_id"]
+    """Авто-kill боссов через 20 секунд после появления — все появившиеся за тик разом.
+
+    Убийство записывается временем респа по расписанию, а не моментом запуска задачи,
+    чтобы цикл авто-kill не сдвигал таймлайн.
+    """
+    spawn_ts = dict(context.job.data["kills"])  # boss_id → респ (unix-секунды)
     
-    db = SessionLocal()
-    try:
-        boss = db.query(Boss).filter(Boss.id == boss_id).first()
-        if not boss:
+    with SessionLocal() as db:
+        # Боссов могли удалить за эти 20 секунд
+        bosses = db.execute(select(Boss.id, Boss.name).where(Boss.id.in_(spawn_ts))).all()
+        if not bosses:
             return
         
-        now = datetime.now(TZ)
-        boss.last_kill_at = _naive_tz(now)
-        db.add(KillLog(boss_id=boss.id, killed_at=boss.last_kill_at, note="авто: появление"))
-        db.commit()
-        logger.info(f"Авто-kill [{boss.id}] {boss.name}")
-    finally:
-        db.close()
+        record_kills(
+            db,
+            [(b.id, datetime.fromtimestamp(spawn_ts[b.id], TZ)) for b in bosses],
+            "авто: появление",
+        )
+        wake_tick(context)
+        for b in bosses:
+            logger.info(f"Авто-kill [{b.id}] {b.name}")
 
 
-async def tick_notifications(context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not _subscribers:
-        return
+@lru_cache(maxsize=8)
+def notification_windows(intervals: tuple[int, ...]) -> tuple[tuple[int, int, int, str], ...]:
+    """Окна уведомлений (от, до, интервал, заголовок) в минутах до респа — строятся один раз на набор интервалов.
 
-    db = SessionLocal()
+    Окно [interval - 1, interval]: next_wake_ts будит тик ровно за interval минут,
+    а более ранний тик (страховочный или по другому боссу) не шлёт раньше срока.
+    """
+    return tuple(
+        (interval - 1, interval, interval, f"⚠️ Через {interval} минут{'у' if interval == 1 else ''} респ:")
+        for interval in intervals
+    )
+
+
+TICK_JOB_NAME = "tick_notifications"
+TICK_MAX_INTERVAL = 300  # секунды: тик не реже этого, даже если событий не ожидается
+TICK_JITTER = 15  # секунды случайного сдвига для запусков «по расписанию», не привязанных к окну
+
+
+def schedule_tick(job_queue, when: float) -> None:
+    """Запланировать тик уведомлений через when секунд.
+
+    Отложенный тик всегда один (TICK_JOB_NAME); если уже запланирован более ранний — он остаётся.
+    """
+    # Страховочный запуск (без ближайшего окна) — со случайным сдвигом, чтобы не совпадать
+    # с другими задачами на хосте; запуски к окну уведомления — точно в срок
+    when = min(max(when, 1), TICK_MAX_INTERVAL - random.uniform(0, TICK_JITTER))
+    run_at = datetime.now(TZ) + timedelta(seconds=when)
+    for job in job_queue.get_jobs_by_name(TICK_JOB_NAME):
+        if job.next_t is not None and job.next_t <= run_at:
+            return
+        job.schedule_removal()
+    job_queue.run_once(tick_notifications, when=when, name=TICK_JOB_NAME)
+
+
+def wake_tick(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Таймеры изменились — пересчитать ближайшее событие сразу."""
+    if context.job_queue:
+        schedule_tick(context.job_queue, 1)
+
+
+def next_wake_ts(db, restart: datetime | None, now: datetime, intervals: tuple[int, ...]) -> int | None:
+    """Ближайший момент после now, когда какому-нибудь боссу пора отправить уведомление.
+
+    Уведомление за interval минут — ровно за interval минут до респа (верхняя граница
+    окна notification_windows), появление — в сам момент респа.
+    """
+    now_ts = _ts(now)
+    next_ts = next_spawn_column(_ts(restart), now_ts)
+    spawns = db.scalars(select(next_ts).where(Boss.is_active, next_ts > now_ts - 120))
+    offsets = [interval * 60 for interval in intervals] + [0]
+    wake = None
+    for ts in spawns:
+        for offset in offsets:
+            t = ts - offset
+            if t > now_ts and (wake is None or t < wake):
+                wake = t
+    return wake
+
+
+async def tick_notifications(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Разослать уведомления и запланировать следующий тик на ближайшее окно."""
+    wake_ts = None
     try:
-        restart = get_server_restart(db)
-        bosses = db.query(Boss).filter(Boss.is_active).all()
-        intervals = get_notification_intervals(db)
+        wake_ts = await _notify_due(context)
+    finally:
+        when = wake_ts - datetime.now(TZ).timestamp() if wake_ts is not None else TICK_MAX_INTERVAL
+        schedule_tick(context.job_queue, when)
+
+
+async def _notify_due(context: ContextTypes.DEFAULT_TYPE) -> int | None:
+    """Уведомления по боссам в окне. Возвращает момент следующего окна (unix-секунды)."""
+    # Снимок подписчиков один раз на тик — общий для всех рассылок тика
+    subs = tuple(_subscribers)
+
+    with SessionLocal() as db:
+        state = _get_state(db)
+        restart = get_server_restart(state)
+        intervals = get_notification_intervals(state)
         now = datetime.now(TZ)
+        # +1 минута — запас к верхней границе окна интервала; без подписчиков слать некому
+        bosses = due_bosses(db, restart, now, max(intervals, default=1) + 1) if subs else ()
+        windows = notification_windows(intervals)
+        now_ts = now.timestamp()
+        _prune_sent(now_ts)
+        spawned: list[tuple[int, int]] = []
 
         for boss in bosses:
-            nxt = boss_next_spawn(boss, restart, now=now)
-            if nxt is None:
-                continue
-            
-            key_base = _spawn_key(nxt)
-            delta_m = (nxt - now).total_seconds() / 60
+            nxt = datetime.fromtimestamp(boss.next_ts, TZ)
+            key_base = boss.next_ts
+            delta_m = (boss.next_ts - now_ts) / 60
 
             # Пропускаем боссов с респом более 2 минут в прошлом.
             # next_spawn_at не догоняет респы в пределах 2 минут, чтобы мы успели отправить уведомление.
             if delta_m <= -2:
                 continue
             
-            if -2 < delta_m <= 1:
-                # Появление (в пределах 2 минут в прошлом или 1 минуты в будущем)
-                notification_key = (boss.id, key_base, 0)
-                if notification_key not in _sent_notifications:
-                    _sent_notifications.add(notification_key)
+            if -2 < delta_m <= 0:
+                # Появление: респ наступил (не более 2 минут назад)
+                if _mark_sent((boss.id, key_base, 0), now_ts):
                     time_str = format_time_short(nxt)
                     message = f"🔴 Босс появился:\n{time_str} | {boss.id} | {boss.name} | {boss.spawn_chance_percent}%"
-                    
-                    for chat_id in list(_subscribers):
-                        try:
-                            sent_msg = await context.bot.send_message(chat_id=chat_id, text=message)
-                            # Удалить сообщение через 4 минут
-                            context.job_queue.run_once(
-                                delete_message_job,
-                                when=240,
-                                data={"chat_id": chat_id, "message_id": sent_msg.message_id}
-                            )
-                        except Exception as e:
-                            logger.error(f"Не удалось отправить в {chat_id}: {e}")
-                            # _subscribers.discard(chat_id)
-                    
-                    # Авто-kill через 20 секунд
-                    context.job_queue.run_once(
-                        auto_kill_job,
-                        when=20,
-                        data={"boss_id": boss.id}
-                    )
+                    # Удалить сообщение через 4 минуты
+                    await broadcast(context, message, delete_after=240, subs=subs)
+                    spawned.append((boss.id, boss.next_ts))
             else:
-                # Проверяем интервалы уведомлений (только для будущих респов)
-                for interval in intervals:
-                    if (interval - 1) <= delta_m <= (interval + 1):
-                        notification_key = (boss.id, key_base, interval)
-                        if notification_key not in _sent_notifications:
-                            _sent_notifications.add(notification_key)
-                            time_str = format_time_short(nxt)
-                            message = f"⚠️ Через {interval} минут{'у' if interval == 1 else ''} респ:\n{time_str} | {boss.id} | {boss.name} | {boss.spawn_chance_percent}%"
-                            
-                            for chat_id in list(_subscribers):
-                                try:
-                                    sent_msg = await context.bot.send_message(chat_id=chat_id, text=message)
-                                    # Удалить сообщение через 5 минут
-                                    context.job_queue.run_once(
-                                        delete_message_job,
-                                        when=300,
-                                        data={"chat_id": chat_id, "message_id": sent_msg.message_id}
-                                    )
-                                except Exception as e:
-                                    logger.error(f"Не удалось отправить в {chat_id}: {e}")
-                                    # _subscribers.discard(chat_id)
-    finally:
-        db.close()
+                # Проверяем окна интервалов уведомлений (только для будущих респов)
+                for lo, hi, interval, header in windows:
+                    if lo <= delta_m <= hi and _mark_sent((boss.id, key_base, interval), now_ts):
+                        message = f"{header}\n{format_time_short(nxt)} | {boss.id} | {boss.name} | {boss.spawn_chance_percent}%"
+                        # Удалить сообщение через 5 минут
+                        await broadcast(context, message, delete_after=300, subs=subs)
+
+        if spawned:
+            # Авто-kill через 20 секунд — одна задача и одна транзакция на всех появившихся
+            context.job_queue.run_once(
+                auto_kill_job,
+                when=20,
+                data={"kills": spawned}
+            )
+
+        return next_wake_ts(db, restart, now, intervals)
+
+
+PUBLIC_COMMANDS = {
+    "help": cmd_help,
+    "start": cmd_start,
+    "list": cmd_list,
+    "test": cmd_test,
+}
+# Права проверяет is_admin в dispatch_command
+ADMIN_COMMANDS = {
+    "restart": cmd_restart,
+    "kill": cmd_kill,
+    "settings": cmd_settings,
+    "boss_add": cmd_boss_add,
+    "boss_del": cmd_boss_del,
+    "boss_edit": cmd_boss_edit,
+    "notifications": cmd_notifications,
+    "admin_add": cmd_admin_add,
+    "admin_del": cmd_admin_del,
+    "admin_list": cmd_admin_list,
+    "backup": cmd_backup,
+}
+# Долгие команды (рассылка, файл БД) — отдельной задачей, как block=False у хендлера,
+# чтобы не задерживать обработку следующих апдейтов; у каждой своя сессия БД
+NON_BLOCKING_COMMANDS = frozenset({"list", "restart", "backup"})
+
+
+async def dispatch_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда → обработчик по словарю: один хендлер вместо линейного перебора CommandHandler'ов."""
+    message = update.effective_message
+    command, _, target = message.text[1:message.entities[0].length].partition("@")
+    if target and target.lower() != context.bot.username.lower():
+        return  # /cmd@другой_бот
+    command = command.lower()
+    handler = PUBLIC_COMMANDS.get(command)
+    if handler is None:
+        handler = ADMIN_COMMANDS.get(command)
+        if handler is None:
+            return
+        if not is_admin(update.effective_user):
+            handler = cmd_denied
+    if command in NON_BLOCKING_COMMANDS:
+        context.application.create_task(handler(update, context), update=update)
+    else:
+        await handler(update, context)
 
 
 def main() -> None:
@@ -1005,6 +1320,8 @@ def main() -> None:
     
     # Загружаем подписчиков из БД
     load_subscribers_from_db()
+    # Заполняем кэш админов до регистрации хендлеров
+    _cached_admins()
 
     app = (
         Application.builder()
@@ -1013,30 +1330,28 @@ def main() -> None:
         .build()
     )
     
-    app.add_handler(CommandHandler("help", cmd_help))
-    app.add_handler(CommandHandler("start", cmd_start))
-    app.add_handler(CommandHandler("list", cmd_list))
-    app.add_handler(CommandHandler("restart", cmd_restart))
-    app.add_handler(CommandHandler("kill", cmd_kill))
-    app.add_handler(CommandHandler("test", cmd_test))
-    app.add_handler(CommandHandler("settings", cmd_settings))
-    app.add_handler(CommandHandler("boss_add", cmd_boss_add))
-    app.add_handler(CommandHandler("boss_del", cmd_boss_del))
-    app.add_handler(CommandHandler("boss_edit", cmd_boss_edit))
-    app.add_handler(CommandHandler("notifications", cmd_notifications))
-    app.add_handler(CommandHandler("admin_add", cmd_admin_add))
-    app.add_handler(CommandHandler("admin_del", cmd_admin_del))
-    app.add_handler(CommandHandler("admin_list", cmd_admin_list))
-    app.add_handler(CommandHandler("backup", cmd_backup))
+    # Все команды — один хендлер со словарём вместо перебора CommandHandler'ов.
+    # Только обычные сообщения, как у CommandHandler: в channel_post / edited_message
+    # update.message пуст
+    app.add_handler(MessageHandler(filters.COMMAND & filters.UpdateType.MESSAGE, dispatch_command))
     
     # Обработчик загрузки файлов БД
-    app.add_handler(MessageHandler(filters.Document.ALL, handle_db_restore))
+    app.add_handler(MessageHandler(filters.Document.ALL & ADMIN_FILTER, handle_db_restore, block=False))
+
+    # Не-админам — отказ (сюда попадают только апдейты, не прошедшие ADMIN_FILTER)
+    app.add_handler(MessageHandler(filters.Document.ALL, cmd_denied))
     
     app.add_handler(CallbackQueryHandler(callback_handler))
 
     job_queue = app.job_queue
     if job_queue:
-        job_queue.run_repeating(tick_notifications, interval=60, first=10)
+        # Тик сам планирует следующий запуск на ближайшее окно уведомления
+        schedule_tick(job_queue, 10 + random.uniform(0, TICK_JITTER))
+        job_queue.run_repeating(
+            reload_admins_job,
+            interval=ADMINS_RELOAD_INTERVAL,
+            first=ADMINS_RELOAD_INTERVAL + random.uniform(0, TICK_JITTER),
+        )
 
     logger.info("✅ Бот запущен. Токен из .env, админы из admins.txt")
     
@@ -1053,7 +1368,15 @@ def main() -> None:
     signal.signal(signal.SIGTERM, signal_handler)
     
     try:
-        app.run_polling(allowed_updates=Update.ALL_TYPES, drop_pending_updates=True)
+        # Long-poll 30 с: Telegram отвечает сразу при новом апдейте, а пустых getUpdates втрое меньше.
+        # Накопившиеся за время перезапуска нажатия не выбрасываем; при сетевых сбоях на старте — повторяем без конца.
+        app.run_polling(
+            allowed_updates=Update.ALL_TYPES,
+            drop_pending_updates=False,
+            timeout=30,
+            poll_interval=0.0,
+            bootstrap_retries=-1,
+        )
     except KeyboardInterrupt:
         logger.info("⚠️ Остановка бота по Ctrl+C...")
     except Exception as e:
@@ -0,0 +1,2 @@
+# test_respawn_logic.py — скрипт с выводом (python test_respawn_logic.py), не тесты pytest
+collect_ignore = ["test_respawn_logic.py"]
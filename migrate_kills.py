@@ -2,12 +2,42 @@
 """Перенос last_kill_at из app_old.db в app.db. Сопоставление по имени босса."""
 
 import sqlite3
+import sys
 from pathlib import Path
 
 PROJECT_ROOT = Path(__file__).resolve().parent
 OLD_DB = PROJECT_ROOT / "app_old.db"
 NEW_DB = PROJECT_ROOT / "app.db"
 
+# Сопоставление по имени делает сам SQLite через ATTACH старой БД.
+# TRIM старых имён считается один раз при заполнении temp-таблицы, дальше —
+# поиск по её PRIMARY KEY. INSERT OR REPLACE в порядке id оставляет последнюю
+# запись при дублях имени (как раньше со словарём).
+# В app.db last_kill_at — INTEGER unix-секунды (EpochDateTime), в старой БД —
+# naive-строки по Simferopol (UTC+3): переводим тем же выражением, что ensure_db_exists.
+CREATE_OLD_KILLS_SQL = "CREATE TEMP TABLE old_kills (name TEXT PRIMARY KEY, last_kill_at)"
+LOAD_OLD_KILLS_SQL = (
+    "INSERT OR REPLACE INTO old_kills (name, last_kill_at)"
+    " SELECT TRIM(name), CASE WHEN typeof(last_kill_at) = 'text'"
+    " THEN CAST(strftime('%s', last_kill_at, '-3 hours') AS INTEGER)"
+    " ELSE last_kill_at END FROM old.bosses"
+    " WHERE last_kill_at IS NOT NULL ORDER BY id"
+)
+MIGRATE_SQL = (
+    "UPDATE bosses SET last_kill_at = k.last_kill_at"
+    " FROM old_kills k WHERE k.name = TRIM(bosses.name)"
+    " RETURNING bosses.id, bosses.name,"
+    " datetime(bosses.last_kill_at, 'unixepoch', '+3 hours')"
+)
+# Те же режимы, что у бота (app/db.py): WAL и fsync только на checkpoint;
+# кэш побольше — скрипт разовый.
+MIGRATE_PRAGMAS = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA cache_size=-65536;
+"""
+
 
 def main():
     if not OLD_DB.exists():
@@ -15,37 +45,30 @@ def main():
     if not NEW_DB.exists():
         raise SystemExit(f"❌ Файл не найден: {NEW_DB}")
 
-    conn_old = sqlite3.connect(OLD_DB)
-    conn_old.row_factory = sqlite3.Row
-    cur_old = conn_old.execute(
-        "SELECT id, name, last_kill_at FROM bosses WHERE last_kill_at IS NOT NULL"
-    )
-    old_bosses = {row["name"].strip(): row["last_kill_at"] for row in cur_old}
-    conn_old.close()
-
-    if not old_bosses:
+    conn = sqlite3.connect(NEW_DB)
+    conn.executescript(MIGRATE_PRAGMAS)
+    conn.execute("ATTACH DATABASE ? AS old", (str(OLD_DB),))
+    conn.execute(CREATE_OLD_KILLS_SQL)
+    conn.execute("BEGIN")
+    conn.execute(LOAD_OLD_KILLS_SQL)
+    if not conn.execute("SELECT EXISTS (SELECT 1 FROM old_kills)").fetchone()[0]:
+        conn.rollback()
+        conn.close()
         print("В старой БД нет записей с last_kill_at. Ничего не переносим.")
         return
 
-    conn_new = sqlite3.connect(NEW_DB)
-    cur_new = conn_new.execute("SELECT id, name FROM bosses")
-    new_bosses = list(cur_new.fetchall())
-    updated = 0
-    for boss_id, name in new_bosses:
-        name_clean = name.strip()
-        if name_clean in old_bosses:
-            last_kill_at = old_bosses[name_clean]
-            conn_new.execute(
-                "UPDATE bosses SET last_kill_at = ? WHERE id = ?",
-                (last_kill_at, boss_id),
-            )
-            updated += 1
-            print(f"  [{boss_id}] {name}: last_kill_at = {last_kill_at}")
-
-    conn_new.commit()
-    conn_new.close()
-
-    print(f"\n✅ Перенесено время убийства для {updated} боссов (из {len(new_bosses)} в новой БД).")
+    total = conn.execute("SELECT COUNT(*) FROM bosses").fetchone()[0]
+    updated_rows = sorted(conn.execute(MIGRATE_SQL).fetchall())
+    conn.commit()
+    conn.close()
+
+    # Весь отчёт по боссам — одним write после commit, а не print на строку
+    sys.stdout.write("".join(
+        f"  [{boss_id}] {name}: last_kill_at = {last_kill_at}\n"
+        for boss_id, name, last_kill_at in updated_rows
+    ))
+
+    print(f"\n✅ Перенесено время убийства для {len(updated_rows)} боссов (из {total} в новой БД).")
 
 
 if __name__ == "__main__":
@@ -1,9 +1,17 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
+
+# Окно для босса без времени убийства — один общий кортеж
+_NONE_PAIR: tuple[None, None] = (None, None)
+
+
+@lru_cache(maxsize=256)
+def _td(minutes: int) -> timedelta:
+    # Значений респа немного, timedelta неизменяем — можно переиспользовать
+    return timedelta(minutes=minutes)
+
 
 def calc_next_window(last_kill_at: datetime | None, min_m: int, max_m: int):
     if not last_kill_at:
-        return None, None
-    return (
-        last_kill_at + timedelta(minutes=min_m),
-        last_kill_at + timedelta(minutes=max_m),
-    )
\ No newline at end of file
+        return _NONE_PAIR
+    return last_kill_at + _td(min_m), last_kill_at + _td(max_m)
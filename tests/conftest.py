@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Скрипты проекта запускаются из корня (python bot.py) — тесты импортируют так же
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,70 @@
+"""migrate_epoch_dates: старые naive-строки (UTC+3) → unix-секунды, один раз на файл БД."""
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine
+
+from app.db import EPOCH_USER_VERSION, Base, migrate_epoch_dates
+from app import models  # noqa: F401 — регистрируем таблицы
+
+UTC3 = timezone(timedelta(hours=3))
+
+
+def _epoch(*args) -> int:
+    return int(datetime(*args, tzinfo=UTC3).timestamp())
+
+
+def _make_legacy_db(path):
+    """БД в старом формате: даты — naive-строки по Simferopol, user_version 0."""
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        INSERT INTO bosses (id, name, spawn_chance_percent, first_spawn_minutes, respawn_minutes, is_active, last_kill_at)
+        VALUES (1, 'Андрас', 50, 600, 720, 1, '2026-02-02 20:56:00.000000'),
+               (2, 'Базил', 50, NULL, 150, 1, '2026-02-03 01:16:11.890388'),
+               (3, 'Баллак', 50, 360, 1440, 1, NULL);
+        INSERT INTO kill_log (id, boss_id, killed_at, note) VALUES (1, 1, '2026-02-02 20:56:00.000000', NULL);
+        INSERT INTO server_state (id, server_restart_at, notification_intervals)
+        VALUES (1, '2026-02-04 09:00:00.000000', '15,5,1');
+    """)
+    conn.commit()
+    conn.close()
+
+
+def _dates(path):
+    conn = sqlite3.connect(path)
+    try:
+        return (
+            conn.execute("SELECT id, last_kill_at FROM bosses ORDER BY id").fetchall(),
+            conn.execute("SELECT killed_at FROM kill_log").fetchall(),
+            conn.execute("SELECT server_restart_at FROM server_state").fetchall(),
+            conn.execute("PRAGMA user_version").fetchone()[0],
+        )
+    finally:
+        conn.close()
+
+
+def test_legacy_strings_become_utc3_epochs_once(tmp_path):
+    path = tmp_path / "app.db"
+    _make_legacy_db(path)
+    engine = create_engine(f"sqlite:///{path}")
+
+    assert migrate_epoch_dates(engine) is True
+    bosses, kills, state, version = _dates(path)
+    assert bosses == [(1, _epoch(2026, 2, 2, 20, 56)), (2, _epoch(2026, 2, 3, 1, 16, 11)), (3, None)]
+    assert kills == [(_epoch(2026, 2, 2, 20, 56),)]
+    assert state == [(_epoch(2026, 2, 4, 9, 0),)]
+    assert version == EPOCH_USER_VERSION
+
+    # Повторный запуск не сканирует таблицы: строка, записанная после перевода, остаётся как есть
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE bosses SET last_kill_at = '2026-02-05 12:00:00' WHERE id = 3")
+    conn.commit()
+    conn.close()
+    assert migrate_epoch_dates(engine) is False
+    bosses, _, _, _ = _dates(path)
+    assert bosses[2] == (3, "2026-02-05 12:00:00")
+    assert bosses[:2] == [(1, _epoch(2026, 2, 2, 20, 56)), (2, _epoch(2026, 2, 3, 1, 16, 11))]
+    engine.dispose()
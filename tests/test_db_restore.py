@@ -0,0 +1,98 @@
+"""restore_db при прогретом пуле: данные загруженного файла не смешиваются со старым -wal."""
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine, event, select, update
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from app.db import _set_sqlite_pragmas, migrate_epoch_dates, restore_db
+from app.models import Boss
+
+OLD_TS = 1767225600  # 01.01.2026 03:00 по UTC+3
+NEW_TS = 1770000000
+
+
+def _make_db(path, kill_ts):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE bosses (id INTEGER PRIMARY KEY, name VARCHAR UNIQUE, spawn_chance_percent INTEGER,"
+        " first_spawn_minutes INTEGER, respawn_minutes INTEGER, is_active BOOLEAN, last_kill_at INTEGER)"
+    )
+    conn.executemany(
+        "INSERT INTO bosses VALUES (?, ?, 100, NULL, 60, 1, ?)",
+        [(i, f"Босс {i}", kill_ts) for i in range(1, 4)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _kill_times(session):
+    return [int(ts.timestamp()) for ts in session.scalars(select(Boss.last_kill_at).order_by(Boss.id))]
+
+
+def test_restore_with_warm_pool(tmp_path):
+    live = tmp_path / "app.db"
+    upload = tmp_path / "upload.db"
+    _make_db(live, None)
+    _make_db(upload, NEW_TS)
+
+    engine = create_engine(f"sqlite:///{live}", poolclass=QueuePool, pool_size=4)
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+
+    # Несколько соединений пула пишут — изменения остаются кадрами в app.db-wal
+    sessions = [Session() for _ in range(3)]
+    for session in sessions:
+        session.execute(update(Boss).values(last_kill_at=datetime.fromtimestamp(OLD_TS, timezone.utc)))
+        session.commit()
+        assert _kill_times(session) == [OLD_TS] * 3
+    assert (tmp_path / "app.db-wal").stat().st_size > 0
+
+    restore_db(str(upload), str(live))
+
+    # Прогретые соединения сразу видят загруженные данные
+    for session in sessions:
+        assert _kill_times(session) == [NEW_TS] * 3
+        session.close()
+
+    # И после checkpoint при закрытии пула старые кадры не возвращаются
+    engine.dispose()
+    conn = sqlite3.connect(live)
+    try:
+        rows = conn.execute("SELECT last_kill_at FROM bosses ORDER BY id").fetchall()
+    finally:
+        conn.close()
+    assert rows == [(NEW_TS,)] * 3
+
+
+def test_restore_missing_file_keeps_db(tmp_path):
+    live = tmp_path / "app.db"
+    _make_db(live, OLD_TS)
+    with pytest.raises(sqlite3.OperationalError):
+        restore_db(str(tmp_path / "missing.db"), str(live))
+    conn = sqlite3.connect(live)
+    try:
+        assert conn.execute("SELECT count(*) FROM bosses").fetchone() == (3,)
+    finally:
+        conn.close()
+
+
+def test_restore_legacy_upload_is_converted(tmp_path):
+    live = tmp_path / "app.db"
+    upload = tmp_path / "upload.db"
+    _make_db(live, OLD_TS)
+    _make_db(upload, "2026-02-02 05:40:00.000000")  # старый формат: naive-строка по UTC+3
+
+    engine = create_engine(f"sqlite:///{live}", poolclass=QueuePool, pool_size=4)
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    session = sessionmaker(bind=engine, expire_on_commit=False)()
+    assert _kill_times(session) == [OLD_TS] * 3
+
+    restore_db(str(upload), str(live))
+    assert migrate_epoch_dates(engine) is True
+
+    assert _kill_times(session) == [NEW_TS] * 3
+    session.close()
+    engine.dispose()
@@ -0,0 +1,73 @@
+"""SQL-выражение next_spawn_column (bot.py) должно совпадать с next_spawn_ts (app/services.py)."""
+import random
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.db import Base
+from app.models import Boss
+from app.seed_data import BOSSES
+from app.services import next_spawn_ts
+from bot import next_spawn_column
+
+TRIALS = 300
+BASE_TS = 1770000000  # 02.02.2026 05:40 по UTC+3
+
+
+@pytest.fixture()
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.execute(insert(Boss), [
+            {"name": b["name"], "spawn_chance_percent": b["chance"], "is_active": True,
+             "first_spawn_minutes": b["first_spawn_minutes"], "respawn_minutes": b["respawn_minutes"]}
+            for b in BOSSES
+        ])
+        # Защитная ветка respawn_minutes <= 0
+        session.execute(insert(Boss), [
+            {"name": "zero", "spawn_chance_percent": 100, "is_active": True,
+             "first_spawn_minutes": None, "respawn_minutes": 0},
+        ])
+        session.commit()
+        yield session
+    engine.dispose()
+
+
+def _random_now(rng, restart_ts, first_min, period):
+    """now около первого появления: в том числе ровно на границах 2-минутного допуска и сетки."""
+    first = restart_ts + (first_min or 0) * 60
+    k = rng.randrange(0, 20)
+    return first + rng.choice((
+        rng.randrange(-86400, 5 * 86400),
+        rng.choice((119, 120, 121)),
+        k * period,
+        k * period + rng.choice((-1, 1)),
+    ))
+
+
+def test_next_spawn_column_matches_next_spawn_ts(db):
+    rng = random.Random(20260204)
+    bosses = db.execute(select(Boss.id, Boss.first_spawn_minutes, Boss.respawn_minutes)).all()
+    for _ in range(TRIALS):
+        restart_ts = None if rng.random() < 0.1 else BASE_TS + rng.randrange(-7 * 86400, 7 * 86400)
+        sample = rng.choice(bosses)
+        now_ts = _random_now(rng, restart_ts or BASE_TS, sample.first_spawn_minutes, max(sample.respawn_minutes, 1) * 60)
+        kills = {
+            b.id: None if rng.random() < 0.5 else now_ts - rng.randrange(0, 3 * 86400)
+            for b in bosses
+        }
+        db.execute(update(Boss), [
+            {"id": boss_id, "last_kill_at": datetime.fromtimestamp(ts, timezone.utc) if ts is not None else None}
+            for boss_id, ts in kills.items()
+        ])
+
+        rows = db.execute(
+            select(Boss.id, Boss.first_spawn_minutes, Boss.respawn_minutes, next_spawn_column(restart_ts, now_ts))
+        ).all()
+        assert len(rows) == len(bosses)
+        for boss_id, first_min, respawn_min, sql_ts in rows:
+            expected = next_spawn_ts(kills[boss_id], restart_ts, first_min, respawn_min, now_ts)
+            assert sql_ts == expected, (boss_id, kills[boss_id], restart_ts, now_ts)